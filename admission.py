@@ -0,0 +1,158 @@
+import threading
+import time
+
+from flask import g, jsonify, request
+
+# Endpoint -> (cost class, priority). Unlisted auth endpoints are standard/normal.
+ENDPOINTS = {
+    # Password hashing or QR rendering
+    'auth.login': ('heavy', 'critical'),
+    'auth.reset_password': ('heavy', 'normal'),
+    'auth.change_password': ('heavy', 'normal'),
+    'auth.setup_2fa': ('heavy', 'normal'),
+    # Database reads/writes and TOTP checks
+    'auth.verify_2fa': ('standard', 'critical'),
+    'auth.google_login': ('standard', 'critical'),
+    'auth.github_login': ('standard', 'critical'),
+    # Send an email within the request, so latency includes SMTP time
+    'auth.register': ('mail', 'low'),
+    'auth.forgot_password': ('mail', 'low'),
+    'auth.resend_verification': ('mail', 'low'),
+    # Session-only or constant responses
+    'auth.profile': ('light', 'normal'),
+    'auth.logout': ('light', 'critical'),
+    'index': ('light', 'critical'),
+}
+
+# Share of a class's current limit each priority may occupy, so lower
+# priorities are shed before the class is full
+PRIORITY_SHARES = {'low': 0.5, 'normal': 0.8, 'critical': 1.0}
+
+
+class AdaptiveLimiter:
+    """Concurrency limit for one cost class, adjusted from observed latency.
+
+    The limit grows by roughly one per limit's worth of fast requests and
+    shrinks multiplicatively when a request exceeds the target latency
+    (AIMD), staying between min_limit and max_limit. Slow requests only
+    count as overload if at least `saturation` of the limit was in flight
+    when they started; below that, slowness comes from the work itself
+    (such as SMTP), not from contention.
+    """
+
+    def __init__(self, max_limit, target_latency, min_limit=1, backoff=0.9, saturation=0.75):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.saturation = saturation
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, share=1.0):
+        """Admit a request if in-flight work stays within share of the limit.
+
+        Returns the number of requests in flight including this one, to be
+        passed to release(), or 0 if the request is shed. An idle class
+        always admits. Otherwise lower shares are shed first, even at the
+        minimum limit.
+        """
+        with self._lock:
+            if self.in_flight == 0:
+                admit = True
+            elif share >= 1.0:
+                admit = self.in_flight < int(self.limit)
+            else:
+                admit = self.in_flight + 1 <= self.limit * share
+            if not admit:
+                self.shed += 1
+                return 0
+            self.in_flight += 1
+            self.admitted += 1
+            return self.in_flight
+
+    def release(self, latency, in_flight):
+        """Finish a request and adapt the limit to its latency.
+
+        in_flight is the value try_acquire() returned for the request.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if latency <= self.target_latency:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            elif in_flight >= self.limit * self.saturation:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+
+    def stats(self):
+        """Counters for monitoring"""
+        return {
+            'limit': round(self.limit, 2),
+            'in_flight': self.in_flight,
+            'admitted': self.admitted,
+            'shed': self.shed,
+        }
+
+
+class AdmissionController:
+    """Per-class concurrency limits with priority shedding for auth routes"""
+
+    def __init__(self, app=None):
+        self.limiters = {}
+        self.retry_after = 1
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Create one limiter per cost class when ADMISSION_CONTROL is on"""
+        app.extensions['admission'] = self
+        if not app.config.get('ADMISSION_CONTROL'):
+            return
+        limits = app.config['ADMISSION_LIMITS']
+        targets = app.config['ADMISSION_TARGET_LATENCY']
+        self.limiters = {
+            cost: AdaptiveLimiter(limits[cost], targets[cost], app.config.get('ADMISSION_MIN_LIMIT', 1))
+            for cost in limits
+        }
+        self.retry_after = app.config.get('ADMISSION_RETRY_AFTER', self.retry_after)
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def classify(self, endpoint):
+        """Return (cost class, priority) for an endpoint, or None if unmanaged"""
+        if endpoint in ENDPOINTS:
+            return ENDPOINTS[endpoint]
+        if endpoint and endpoint.startswith('auth.'):
+            return ('standard', 'normal')
+        return None
+
+    def _before_request(self):
+        classification = self.classify(request.endpoint)
+        if classification is None:
+            return None
+        cost, priority = classification
+        limiter = self.limiters.get(cost)
+        if limiter is None:
+            return None
+        in_flight = limiter.try_acquire(PRIORITY_SHARES[priority])
+        if not in_flight:
+            response = jsonify({'message': 'Server is overloaded, please retry shortly'})
+            response.headers['Retry-After'] = str(self.retry_after)
+            return response, 503
+        g.admission = (limiter, time.monotonic(), in_flight)
+        return None
+
+    def _teardown_request(self, exc=None):
+        admitted = g.pop('admission', None)
+        if admitted is not None:
+            limiter, started, in_flight = admitted
+            limiter.release(time.monotonic() - started, in_flight)
+
+    def stats(self):
+        """Counters for every cost class"""
+        return {cost: limiter.stats() for cost, limiter in self.limiters.items()}
+
+
+admission = AdmissionController()
@@ -0,0 +1,170 @@
+import csv
+import os
+from collections import defaultdict
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import case, func
+from models import db, User, read_replica
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+COLUMNS = [
+    'date', 'signups', 'verified', 'verified_ratio', 'two_fa_enabled',
+    'oauth_google', 'oauth_github', 'password_only',
+]
+WATERMARK_FILE = '_watermark'
+
+
+def _count_if(condition):
+    return func.sum(case((condition, 1), else_=0))
+
+
+def daily_activity(since=None):
+    """Yield one aggregate row per signup day, grouped in the database.
+
+    Only days on or after `since` (a YYYY-MM-DD string) are included.
+    """
+    day = func.date(User.created_at)
+    statement = db.select(
+        day.label('day'),
+        func.count(User.id),
+        _count_if(User.email_verified.is_(True)),
+        _count_if(User.two_fa_enabled.is_(True)),
+        _count_if(User.oauth_provider == 'google'),
+        _count_if(User.oauth_provider == 'github'),
+    ).where(User.created_at.isnot(None))
+    if since:
+        statement = statement.where(User.created_at >= since)
+    statement = statement.group_by(day).order_by(day).execution_options(yield_per=500)
+
+    # Execute inside the block but stream rows outside it, so queries the
+    # caller makes between rows are not routed to the replica
+    with read_replica():
+        rows = db.session.execute(statement)
+    for day_value, signups, verified, two_fa, google, github in rows:
+        signups, verified, two_fa = int(signups), int(verified or 0), int(two_fa or 0)
+        google, github = int(google or 0), int(github or 0)
+        yield {
+            'date': str(day_value),
+            'signups': signups,
+            'verified': verified,
+            'verified_ratio': round(verified / signups, 4) if signups else 0.0,
+            'two_fa_enabled': two_fa,
+            'oauth_google': google,
+            'oauth_github': github,
+            'password_only': signups - google - github,
+        }
+
+
+def _read_partition(path, fmt):
+    if not os.path.exists(path):
+        return []
+    if fmt == 'parquet':
+        return pq.read_table(path).to_pylist()
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def _write_partition(path, rows, fmt):
+    tmp_path = f'{path}.tmp'
+    if fmt == 'parquet':
+        table = pyarrow.Table.from_pylist(rows)
+        pq.write_table(table, tmp_path)
+    else:
+        with open(tmp_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def read_watermark(output_dir):
+    """Return the last exported day, or None for a first run"""
+    path = os.path.join(output_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read().strip() or None
+
+
+def export_daily_activity(output_dir, fmt='csv', full=False):
+    """Export daily activity into one file per month under output_dir.
+
+    Incremental runs recompute from the watermark day onwards, since that
+    day may have been partial, and rewrite only the affected months.
+    Returns the number of day rows written.
+    """
+    if fmt == 'parquet' and not HAS_PYARROW:
+        raise RuntimeError('pyarrow is required for parquet output')
+    os.makedirs(output_dir, exist_ok=True)
+    since = None if full else read_watermark(output_dir)
+
+    written = 0
+    watermark = since
+    month, month_rows = None, []
+
+    def flush():
+        path = os.path.join(output_dir, f'daily-{month}.{fmt}')
+        by_day = {str(row['date']): row for row in _read_partition(path, fmt)}
+        by_day.update((row['date'], row) for row in month_rows)
+        _write_partition(path, [by_day[day] for day in sorted(by_day)], fmt)
+
+    for row in daily_activity(since):
+        if row['date'][:7] != month:
+            if month_rows:
+                flush()
+            month, month_rows = row['date'][:7], []
+        month_rows.append(row)
+        written += 1
+        watermark = row['date']
+    if month_rows:
+        flush()
+
+    if watermark:
+        with open(os.path.join(output_dir, WATERMARK_FILE), 'w') as f:
+            f.write(watermark)
+    return written
+
+
+def summarize(rows):
+    """Total a sequence of daily rows"""
+    totals = defaultdict(int)
+    for row in rows:
+        for column in COLUMNS[1:]:
+            if column != 'verified_ratio':
+                totals[column] += int(row[column])
+    signups = totals['signups']
+    totals['verified_ratio'] = round(totals['verified'] / signups, 4) if signups else 0.0
+    return dict(totals)
+
+
+@click.group('analytics')
+def analytics_cli():
+    """User activity reports."""
+
+
+@analytics_cli.command('export')
+@click.option('--output', 'output_dir', default='analytics', show_default=True,
+              help='Directory for the monthly partition files.')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'parquet']), default='csv', show_default=True)
+@click.option('--full', is_flag=True, help='Ignore the watermark and rebuild every month.')
+@with_appcontext
+def export_command(output_dir, fmt, full):
+    """Export daily signups, verification, 2FA and OAuth counts."""
+    written = export_daily_activity(output_dir, fmt, full)
+    click.echo(f'{written} days exported to {output_dir} (watermark {read_watermark(output_dir)})')
+
+
+@analytics_cli.command('summary')
+@click.option('--since', help='First day to include (YYYY-MM-DD).')
+@with_appcontext
+def summary_command(since):
+    """Print totals computed directly from the database."""
+    for column, value in summarize(daily_activity(since)).items():
+        click.echo(f'{column}: {value}')
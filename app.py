@@ -1,19 +1,32 @@
-from flask import Flask
+from flask import Flask, request
 from flask_login import LoginManager
 from flask_mail import Mail
+from flask_migrate import Migrate
 from config import Config
 from models import db, User
+from tickets import login_tickets
+from admission import admission
+from profiler import route_profiler, profile_cli
+from backfill import backfill_cli
+from mailer import mailer, mail_cli
+from analytics import analytics_cli
 
 mail = Mail()
+migrate = Migrate()
 
-def create_app():
+def create_app(config_object=Config):
     """Application factory"""
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_object)
     
     # Initialize extensions
     db.init_app(app)
+    migrate.init_app(app, db)
     mail.init_app(app)
+    mailer.init_app(app, mail)
+    login_tickets.init_app(app)
+    admission.init_app(app)
+    route_profiler.init_app(app)
     
     # Initialize login manager
     login_manager = LoginManager()
@@ -23,16 +36,26 @@ def create_app():
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # Write endpoints read current_user back after changing it, so only
+        # safe-method requests such as /profile may use the replica
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return User.lookup_by_id(int(user_id))
+        return db.session.get(User, int(user_id))
     
     # Create database tables
-    with app.app_context():
-        db.create_all()
+    if app.config['AUTO_CREATE_TABLES']:
+        with app.app_context():
+            db.create_all()
     
     # Register blueprints
     from routes import auth_bp
     app.register_blueprint(auth_bp)
     
+    app.cli.add_command(backfill_cli)
+    app.cli.add_command(profile_cli)
+    app.cli.add_command(mail_cli)
+    app.cli.add_command(analytics_cli)
+    
     @app.route('/')
     def index():
         return {'message': 'Flask Authentication System', 'version': '1.0'}, 200
@@ -0,0 +1,112 @@
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from models import db, User, BackfillProgress
+
+# Registered backfills: name -> function(list_of_users)
+BACKFILLS = {}
+
+
+def backfill(name):
+    """Register a function that updates one batch of users in place"""
+    def decorator(func):
+        BACKFILLS[name] = func
+        return func
+    return decorator
+
+
+def run_backfill(name, batch_size=None, pause=None, max_batches=None, restart=False):
+    """Run a registered backfill in keyset-paginated batches.
+
+    Each batch and its checkpoint are committed together, so an interrupted
+    run resumes from the last committed user id. Returns the progress row.
+    """
+    if name not in BACKFILLS:
+        raise KeyError(f'Unknown backfill: {name}')
+    func = BACKFILLS[name]
+    batch_size = batch_size or current_app.config['BACKFILL_BATCH_SIZE']
+    pause = current_app.config['BACKFILL_PAUSE'] if pause is None else pause
+
+    progress = db.session.get(BackfillProgress, name)
+    if progress is None:
+        progress = BackfillProgress(name=name, last_id=0, rows_processed=0)
+        db.session.add(progress)
+    elif restart:
+        progress.last_id = 0
+        progress.rows_processed = 0
+        progress.completed_at = None
+    db.session.commit()
+
+    batches = 0
+    while progress.completed_at is None:
+        if max_batches is not None and batches >= max_batches:
+            break
+        users = (User.query
+                 .filter(User.id > progress.last_id)
+                 .order_by(User.id)
+                 .limit(batch_size)
+                 .all())
+        if not users:
+            progress.completed_at = datetime.utcnow()
+            db.session.commit()
+            break
+
+        func(users)
+        progress.last_id = users[-1].id
+        progress.rows_processed += len(users)
+        db.session.commit()
+        batches += 1
+
+        if pause:
+            time.sleep(pause)
+
+    return progress
+
+
+@backfill('oauth-provider')
+def backfill_oauth_provider(users):
+    """Fill oauth_provider for accounts linked before it was recorded"""
+    for user in users:
+        if user.oauth_provider:
+            continue
+        if user.google_id:
+            user.oauth_provider = 'google'
+        elif user.github_id:
+            user.oauth_provider = 'github'
+
+
+@click.group('backfill')
+def backfill_cli():
+    """Batched data backfills."""
+
+
+@backfill_cli.command('run')
+@click.argument('name')
+@click.option('--batch-size', type=int, help='Rows per batch.')
+@click.option('--pause', type=float, help='Seconds to sleep between batches.')
+@click.option('--max-batches', type=int, help='Stop after this many batches.')
+@click.option('--restart', is_flag=True, help='Ignore the saved checkpoint.')
+@with_appcontext
+def run_command(name, batch_size, pause, max_batches, restart):
+    """Run or resume backfill NAME."""
+    if name not in BACKFILLS:
+        raise click.BadParameter(f'choose from {", ".join(sorted(BACKFILLS))}', param_hint='NAME')
+    progress = run_backfill(name, batch_size, pause, max_batches, restart)
+    state = 'complete' if progress.completed_at else 'paused'
+    click.echo(f'{name}: {progress.rows_processed} rows processed, last id {progress.last_id} ({state})')
+
+
+@backfill_cli.command('status')
+@with_appcontext
+def status_command():
+    """Show checkpoints for every registered backfill."""
+    for name in sorted(BACKFILLS):
+        progress = db.session.get(BackfillProgress, name)
+        if progress is None:
+            click.echo(f'{name}: not started')
+        else:
+            state = 'complete' if progress.completed_at else 'in progress'
+            click.echo(f'{name}: {progress.rows_processed} rows, last id {progress.last_id} ({state})')
@@ -0,0 +1,98 @@
+"""
+Overload benchmark: cheap-route latency while hash-heavy routes are saturated
+Run: python bench_overload.py [heavy_threads] [seconds]
+
+Runs the same scenario with admission control off and on and prints latency
+percentiles for the light route, plus throughput, latency of admitted
+requests and 503s for /login.
+"""
+
+import sys
+import tempfile
+import threading
+import time
+
+from config import Config
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_scenario(admission_enabled, heavy_threads, seconds):
+    from app import create_app
+    from models import db, User
+
+    class BenchConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+        AUTO_CREATE_TABLES = True
+        ADMISSION_CONTROL = admission_enabled
+        ADMISSION_LIMITS = {'heavy': 2, 'standard': 16, 'light': 32, 'mail': 8}
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com', is_active=True, email_verified=True)
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+
+    stop = time.monotonic() + seconds
+    light_latencies, login_latencies, heavy_shed = [], [], [0]
+    lock = threading.Lock()
+
+    def heavy():
+        client = app.test_client()
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            response = client.post('/login', json={'username': 'bench', 'password': 'password123'})
+            with lock:
+                if response.status_code == 503:
+                    heavy_shed[0] += 1
+                else:
+                    login_latencies.append(time.perf_counter() - started)
+            if response.status_code == 503:
+                time.sleep(0.1)  # a well-behaved client backing off
+
+    def light():
+        client = app.test_client()
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            client.get('/')
+            with lock:
+                light_latencies.append(time.perf_counter() - started)
+            time.sleep(0.005)
+
+    threads = [threading.Thread(target=heavy) for _ in range(heavy_threads)]
+    threads += [threading.Thread(target=light) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'light_p50_ms': 1000 * percentile(light_latencies, 50),
+        'light_p99_ms': 1000 * percentile(light_latencies, 99),
+        'light_requests': len(light_latencies),
+        'login_ok_per_s': len(login_latencies) / seconds,
+        'login_p99_ms': 1000 * percentile(login_latencies, 99),
+        'login_503': heavy_shed[0],
+    }
+
+
+def main():
+    heavy_threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f"{heavy_threads} threads saturating /login for {seconds:.0f}s, 4 threads polling /")
+    print(f"{'admission':10} {'/ p50 ms':>10} {'/ p99 ms':>10} {'/ reqs':>8} {'login ok/s':>11} {'login p99 ms':>13} {'login 503':>10}")
+    for enabled in (False, True):
+        result = run_scenario(enabled, heavy_threads, seconds)
+        print(f"{'on' if enabled else 'off':10} {result['light_p50_ms']:10.1f} {result['light_p99_ms']:10.1f} "
+              f"{result['light_requests']:8d} {result['login_ok_per_s']:11.1f} {result['login_p99_ms']:13.0f} {result['login_503']:10d}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""
+Microbenchmark: pooled token factory vs. per-token secrets.token_urlsafe
+Run: python bench_tokens.py [count]
+"""
+
+import secrets
+import sys
+import timeit
+
+from tokens import TokenFactory
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    factory = TokenFactory()
+    cases = [
+        ('verification/reset (32 bytes)', lambda: secrets.token_urlsafe(32), factory.verification_token),
+        ('backup code (8 bytes)', lambda: secrets.token_urlsafe(8), lambda: factory.token_urlsafe(8)),
+        ('ticket id (16 bytes)', lambda: secrets.token_urlsafe(16), factory.ticket_id),
+    ]
+    print(f"{'token':32} {'secrets/s':>12} {'pooled/s':>12} {'speedup':>8}")
+    for name, baseline, pooled in cases:
+        base_time = min(timeit.repeat(baseline, number=count, repeat=3))
+        pool_time = min(timeit.repeat(pooled, number=count, repeat=3))
+        print(f"{name:32} {count / base_time:12,.0f} {count / pool_time:12,.0f} {base_time / pool_time:7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
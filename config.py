@@ -1,12 +1,39 @@
 import os
 from datetime import timedelta
 
+
+def database_url(name):
+    """Read a database URL from the environment.
+
+    Heroku Postgres sets postgres:// URLs, which SQLAlchemy 1.4+ rejects.
+    """
+    url = os.environ.get(name)
+    if url and url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
 class Config:
     """Base configuration"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-change-this'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///auth_system.db'
+    SQLALCHEMY_DATABASE_URI = database_url('DATABASE_URL') or 'sqlite:///auth_system.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Optional read replica for lookup-only queries (see models.read_replica)
+    DATABASE_REPLICA_URL = database_url('DATABASE_REPLICA_URL')
+    SQLALCHEMY_BINDS = {'replica': DATABASE_REPLICA_URL} if DATABASE_REPLICA_URL else {}
+    
+    # Schema management: tables come from `flask db upgrade`. Enable only for
+    # throwaway databases; create_all() runs on import, before any migration
+    AUTO_CREATE_TABLES = os.environ.get('AUTO_CREATE_TABLES', 'false').lower() == 'true'
+    
+    # Seconds between log lines with the user lookup coalescing counters (0 disables)
+    LOOKUP_STATS_INTERVAL = 60
+    
+    # Batched data backfills
+    BACKFILL_BATCH_SIZE = 1000
+    BACKFILL_PAUSE = 0.05  # seconds between batches
+    
     # Flask-Login config
     REMEMBER_COOKIE_DURATION = timedelta(days=7)
     
@@ -17,3 +44,25 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'noreply@authsystem.com'
+    MAIL_BATCH_SIZE = 100  # messages per pooled SMTP connection and users per bulk batch
+    
+    # Base URL used for links in emails
+    APP_BASE_URL = os.environ.get('APP_BASE_URL') or 'http://localhost:5000'
+    
+    # Pending 2FA login tickets
+    LOGIN_TICKET_TTL = 300  # seconds
+    LOGIN_TICKET_MAX_ENTRIES = 10000
+    LOGIN_TICKET_MAX_ATTEMPTS = 5
+    
+    # Sampling profiler for auth routes (0 disables)
+    PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE') or 0)
+    PROFILER_INTERVAL = 0.005  # seconds between stack samples
+    PROFILER_FLUSH_INTERVAL = 10  # seconds between writes to disk
+    PROFILER_OUTPUT_DIR = os.environ.get('PROFILER_OUTPUT_DIR') or 'profiles'
+    
+    # Admission control: per-cost-class concurrency limits for auth routes
+    ADMISSION_CONTROL = os.environ.get('ADMISSION_CONTROL', 'true').lower() == 'true'
+    ADMISSION_LIMITS = {'heavy': 8, 'standard': 32, 'light': 64, 'mail': 16}  # max in-flight per worker
+    ADMISSION_TARGET_LATENCY = {'heavy': 1.0, 'standard': 0.3, 'light': 0.1, 'mail': 5.0}  # seconds
+    ADMISSION_MIN_LIMIT = 1
+    ADMISSION_RETRY_AFTER = 1  # seconds, sent with 503 responses
@@ -0,0 +1,170 @@
+import smtplib
+import socket
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flask_mail import Message
+from models import db, User
+
+# Email kind -> (subject, template name without extension, link path)
+EMAILS = {
+    'verification': ('Email Verification', 'email/verification', '/verify-email/'),
+    'reset': ('Password Reset Request', 'email/reset_password', '/reset-password/'),
+}
+
+
+class Mailer:
+    """Renders account emails from precompiled templates and sends them"""
+
+    def __init__(self, app=None, mail=None):
+        self.mail = mail
+        self.base_url = 'http://localhost:5000'
+        self._templates = {}
+        if app is not None:
+            self.init_app(app, mail)
+
+    def init_app(self, app, mail):
+        """Compile the email templates once and read link settings"""
+        self.mail = mail
+        self.base_url = app.config['APP_BASE_URL'].rstrip('/')
+        self._templates = {
+            kind: (subject,
+                   app.jinja_env.get_template(f'{name}.txt'),
+                   app.jinja_env.get_template(f'{name}.html'),
+                   path)
+            for kind, (subject, name, path) in EMAILS.items()
+        }
+        app.extensions['mailer'] = self
+
+    def render(self, kind, user, token):
+        """Build the Message of the given kind for user"""
+        subject, text_template, html_template, path = self._templates[kind]
+        context = {'user': user, 'link': f'{self.base_url}{path}{token}'}
+        return Message(subject,
+                       recipients=[user.email],
+                       body=text_template.render(context),
+                       html=html_template.render(context))
+
+    def send(self, message):
+        """Send a single message, returning False on failure"""
+        try:
+            self.mail.send(message)
+            return True
+        except Exception as e:
+            print(f"Error sending email: {e}")
+            return False
+
+    def send_bulk(self, batches):
+        """Send batches of messages, one pooled SMTP connection per batch.
+
+        Batches are consumed lazily, so generators keep memory bounded. A
+        message the server refuses counts as failed and sending continues. If
+        the server drops the connection, it is reopened and the message
+        retried once. If the server stays unavailable, sending stops: the rest
+        of the current batch counts as failed and no further batches are
+        drawn. Returns a (sent, failed) tuple.
+        """
+        sent = failed = 0
+        for batch in batches:
+            conn = None
+            try:
+                for index, message in enumerate(batch):
+                    try:
+                        if conn is None:
+                            conn = self.mail.connect().__enter__()
+                        try:
+                            conn.send(message)
+                        except smtplib.SMTPServerDisconnected:
+                            # Reopen a dropped connection and retry once
+                            _close_quietly(conn)
+                            conn = None
+                            conn = self.mail.connect().__enter__()
+                            conn.send(message)
+                        sent += 1
+                    except _UNAVAILABLE as e:
+                        print(f"Mail server unavailable: {e}")
+                        return sent, failed + len(batch) - index
+                    except Exception as e:
+                        print(f"Error sending email to {message.recipients}: {e}")
+                        failed += 1
+            finally:
+                _close_quietly(conn)
+        return sent, failed
+
+
+# Errors meaning the mail server cannot be used at all. Other SMTP errors,
+# such as a refused recipient, only fail the message being sent.
+_UNAVAILABLE = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError,
+                smtplib.SMTPAuthenticationError, ConnectionError, socket.timeout)
+
+
+def _close_quietly(conn):
+    """Close a connection that may already be dead"""
+    if conn is None:
+        return
+    try:
+        conn.__exit__(None, None, None)
+    except (smtplib.SMTPException, OSError):
+        pass
+
+
+def _iter_user_batches(query, batch_size):
+    """Yield lists of users from query in primary-key order"""
+    last_id = 0
+    while True:
+        users = query.filter(User.id > last_id).order_by(User.id).limit(batch_size).all()
+        if not users:
+            return
+        last_id = users[-1].id
+        yield users
+
+
+def reverification_messages(batch_size):
+    """Issue fresh verification tokens to unverified users, yielding a list of emails per batch"""
+    query = User.query.filter(db.or_(User.email_verified.is_(False), User.email_verified.is_(None)))
+    for users in _iter_user_batches(query, batch_size):
+        # Render before committing so expired attributes are not reloaded
+        messages = [mailer.render('verification', user, user.generate_verification_token()) for user in users]
+        db.session.commit()
+        db.session.expunge_all()
+        yield messages
+
+
+def force_reset_messages(batch_size):
+    """Issue reset tokens to every password account, yielding a list of emails per batch"""
+    query = User.query.filter(User.password_hash.isnot(None))
+    for users in _iter_user_batches(query, batch_size):
+        # Render before committing so expired attributes are not reloaded
+        messages = [mailer.render('reset', user, user.generate_reset_token()) for user in users]
+        db.session.commit()
+        db.session.expunge_all()
+        yield messages
+
+
+@click.group('mail')
+def mail_cli():
+    """Bulk account email campaigns."""
+
+
+@mail_cli.command('reverify')
+@click.option('--batch-size', type=int, help='Users loaded per batch.')
+@with_appcontext
+def reverify_command(batch_size):
+    """Resend verification emails to all unverified users."""
+    batch_size = batch_size or current_app.config['MAIL_BATCH_SIZE']
+    sent, failed = mailer.send_bulk(reverification_messages(batch_size))
+    click.echo(f'{sent} verification emails sent, {failed} failed')
+
+
+@mail_cli.command('force-reset')
+@click.option('--batch-size', type=int, help='Users loaded per batch.')
+@with_appcontext
+def force_reset_command(batch_size):
+    """Send password reset links to every password-based account."""
+    batch_size = batch_size or current_app.config['MAIL_BATCH_SIZE']
+    sent, failed = mailer.send_bulk(force_reset_messages(batch_size))
+    click.echo(f'{sent} password reset emails sent, {failed} failed')
+
+
+mailer = Mailer()
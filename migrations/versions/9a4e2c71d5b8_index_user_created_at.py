@@ -0,0 +1,29 @@
+"""index user created_at
+
+Revision ID: 9a4e2c71d5b8
+Revises: 3f1c9a7d2b64
+Create Date: 2026-10-19 17:42:10.503318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4e2c71d5b8'
+down_revision = '3f1c9a7d2b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Built without blocking writes on PostgreSQL
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_user_created_at'), 'user', ['created_at'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_user_created_at'), table_name='user',
+                      postgresql_concurrently=True)
@@ -1,10 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
-import secrets
 import pyotp
 import base64
+from contextlib import contextmanager, nullcontext
+from flask import current_app
+from sqlalchemy.orm import make_transient_to_detached
+from singleflight import SingleFlight
+from tokens import token_factory
 
 try:
     import qrcode
@@ -13,7 +18,42 @@ try:
 except ImportError:
     HAS_QRCODE = False
 
-db = SQLAlchemy()
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    """Session that can send lookups to the read replica bind.
+
+    Queries go to the primary unless made inside read_replica() and a
+    'replica' bind is configured. Flushes always go to the primary.
+    """
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('use_replica') and not self._flushing:
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+@contextmanager
+def read_replica():
+    """Route queries made inside the block to the read replica"""
+    session = db.session()
+    previous = session.info.get('use_replica', False)
+    session.info['use_replica'] = True
+    try:
+        yield
+    finally:
+        session.info['use_replica'] = previous
+
+
+# Coalesces concurrent identical user lookups within this worker
+user_lookups = SingleFlight()
+
 
 class User(UserMixin, db.Model):
     """User model for authentication"""
@@ -38,9 +78,52 @@ class User(UserMixin, db.Model):
     github_id = db.Column(db.String(255), unique=True)
     oauth_provider = db.Column(db.String(50))  # 'google', 'github', etc.
     
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    @classmethod
+    def lookup(cls, **filters):
+        """Find a user on the read replica; not for read-after-write paths.
+        
+        Identical lookups already in flight in this worker share one query.
+        """
+        return cls._coalesced_lookup(tuple(sorted(filters.items())))
+    
+    @classmethod
+    def lookup_by_id(cls, user_id):
+        """Load a user by id from the read replica"""
+        return cls._coalesced_lookup((('id', user_id),))
+    
+    @classmethod
+    def load(cls, user_id):
+        """Load a user by id from the primary, sharing concurrent loads"""
+        return cls._coalesced_lookup((('id', user_id),), replica=False)
+    
+    @classmethod
+    def _coalesced_lookup(cls, filters, replica=True):
+        engine = (db.engines.get(REPLICA_BIND) if replica else None) or db.engine
+        
+        def fetch():
+            statement = db.select(cls.__table__).filter_by(**dict(filters)).limit(1)
+            with read_replica() if replica else nullcontext():
+                row = db.session.execute(statement).mappings().first()
+            return dict(row) if row else None
+        
+        row = user_lookups.do((id(engine), filters), fetch)
+        interval = current_app.config.get('LOOKUP_STATS_INTERVAL')
+        if interval and user_lookups.report_due(interval):
+            print(f"User lookups: {user_lookups.stats()}")
+        if row is None:
+            return None
+        # Keep any instance this session already holds, with its pending changes
+        existing = db.session.identity_map.get(db.session.identity_key(cls, row['id']))
+        if existing is not None:
+            return existing
+        # Each caller gets its own instance in its own session
+        user = cls(**row)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+    
     def set_password(self, password):
         """Hash and set the password"""
         self.password_hash = generate_password_hash(password)
@@ -51,7 +134,7 @@ class User(UserMixin, db.Model):
     
     def generate_verification_token(self):
         """Generate email verification token"""
-        self.verification_token = secrets.token_urlsafe(32)
+        self.verification_token = token_factory.verification_token()
         self.verification_token_expiry = datetime.utcnow() + timedelta(hours=24)
         return self.verification_token
     
@@ -69,7 +152,7 @@ class User(UserMixin, db.Model):
     
     def generate_reset_token(self):
         """Generate password reset token"""
-        self.reset_token = secrets.token_urlsafe(32)
+        self.reset_token = token_factory.reset_token()
         self.reset_token_expiry = datetime.utcnow() + timedelta(hours=1)
         return self.reset_token
     
@@ -134,7 +217,7 @@ class User(UserMixin, db.Model):
         self.two_fa_enabled = True
         # Generate backup codes
         import json
-        backup_codes = [secrets.token_urlsafe(8) for _ in range(10)]
+        backup_codes = token_factory.backup_codes(10)
         self.two_fa_backup_codes = json.dumps(backup_codes)
     
     def get_2fa_backup_codes(self):
@@ -152,3 +235,15 @@ class User(UserMixin, db.Model):
     
     def __repr__(self):
         return f'<User {self.username}>'
+
+
+class BackfillProgress(db.Model):
+    """Checkpoint for a resumable batched data backfill"""
+    name = db.Column(db.String(100), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    completed_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<BackfillProgress {self.name} @ {self.last_id}>'
@@ -0,0 +1,236 @@
+import atexit
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+import click
+from flask import current_app, g, request
+from flask.cli import with_appcontext
+
+
+def _fold_stack(frame):
+    """Collapse a frame chain into a root-first flamegraph stack string"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class RouteProfiler:
+    """Sampling profiler for a fraction of auth blueprint requests.
+
+    One background thread samples the stacks of every thread currently
+    serving a profiled request and aggregates them per endpoint; it sleeps
+    while no profiled request is running. Samples are flushed as folded
+    stacks to one file per endpoint and process.
+    """
+
+    def __init__(self, app=None):
+        self._active = {}  # thread id -> endpoint
+        self._stacks = defaultdict(Counter)  # endpoint -> folded stack -> samples
+        self._lock = threading.Lock()
+        self._profiling = threading.Event()  # set while _active is non-empty
+        self._unflushed = False
+        self._thread = None
+        self._atexit_registered = False
+        self.sample_rate = 0.0
+        self.interval = 0.005
+        self.flush_interval = 10.0
+        self.output_dir = 'profiles'
+        self.blueprints = ('auth',)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register request hooks when PROFILER_SAMPLE_RATE is set"""
+        self.sample_rate = app.config.get('PROFILER_SAMPLE_RATE', 0.0)
+        self.interval = app.config.get('PROFILER_INTERVAL', self.interval)
+        self.flush_interval = app.config.get('PROFILER_FLUSH_INTERVAL', self.flush_interval)
+        self.output_dir = app.config.get('PROFILER_OUTPUT_DIR', self.output_dir)
+        app.extensions['profiler'] = self
+        if not self.sample_rate:
+            return
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+        if not self._atexit_registered:
+            atexit.register(self.flush)
+            self._atexit_registered = True
+
+    def _before_request(self):
+        if request.blueprint not in self.blueprints or random.random() >= self.sample_rate:
+            return
+        g.profiled = True
+        with self._lock:
+            self._active[threading.get_ident()] = request.endpoint
+            self._profiling.set()
+        self._ensure_sampler()
+
+    def _teardown_request(self, exc=None):
+        if g.pop('profiled', False):
+            with self._lock:
+                self._active.pop(threading.get_ident(), None)
+                if not self._active:
+                    self._profiling.clear()
+
+    def _ensure_sampler(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='route-profiler', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            # While idle, wake only when a flush of collected samples is due
+            timeout = None
+            if self._unflushed:
+                timeout = max(0.0, last_flush + self.flush_interval - time.monotonic())
+            if self._profiling.wait(timeout):
+                time.sleep(self.interval)
+                self.sample()
+            if self._unflushed and time.monotonic() - last_flush >= self.flush_interval:
+                self.flush()
+                last_flush = time.monotonic()
+
+    def sample(self):
+        """Record one stack sample for every thread in a profiled request"""
+        with self._lock:
+            active = dict(self._active)
+        if not active:
+            return
+        frames = sys._current_frames()
+        with self._lock:
+            for thread_id, endpoint in active.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self._stacks[endpoint][_fold_stack(frame)] += 1
+                    self._unflushed = True
+
+    def profiles(self):
+        """Return a copy of the aggregated samples per endpoint"""
+        with self._lock:
+            return {endpoint: Counter(stacks) for endpoint, stacks in self._stacks.items()}
+
+    def flush(self):
+        """Write cumulative samples to <output_dir>/<endpoint>.<pid>.folded"""
+        self._unflushed = False
+        profiles = self.profiles()
+        if not profiles:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        for endpoint, stacks in profiles.items():
+            path = os.path.join(self.output_dir, f'{endpoint}.{os.getpid()}.folded')
+            write_folded(path, stacks)
+
+    def reset(self):
+        """Discard collected samples"""
+        with self._lock:
+            self._stacks.clear()
+            self._unflushed = False
+
+
+def write_folded(path, stacks):
+    """Write a Counter of folded stacks in flamegraph.pl input format"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        for stack, count in sorted(stacks.items()):
+            f.write(f'{stack} {count}\n')
+    os.replace(tmp_path, path)
+
+
+def read_folded(path):
+    """Read a folded-stack file into a Counter"""
+    stacks = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack:
+                stacks[stack] += int(count)
+    return stacks
+
+
+def load_profile_dir(directory):
+    """Merge the per-process files in a profile directory per endpoint"""
+    profiles = defaultdict(Counter)
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.folded'):
+            continue
+        endpoint = name[:-len('.folded')].rsplit('.', 1)[0]
+        profiles[endpoint].update(read_folded(os.path.join(directory, name)))
+    return dict(profiles)
+
+
+def self_samples(stacks):
+    """Count samples by the innermost frame of each stack"""
+    leaves = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(';', 1)[-1]] += count
+    return leaves
+
+
+@click.group('profile')
+def profile_cli():
+    """Inspect route profiles collected by the sampling profiler."""
+
+
+@profile_cli.command('dump')
+@click.argument('directory', required=False)
+@click.option('--output', type=click.Path(), help='Write merged folded stacks here.')
+@click.option('--top', default=10, help='Hot frames to show per route.')
+@with_appcontext
+def dump_command(directory, output, top):
+    """Summarise the profiles in DIRECTORY (default PROFILER_OUTPUT_DIR)."""
+    directory = directory or current_app.config.get('PROFILER_OUTPUT_DIR', 'profiles')
+    profiles = load_profile_dir(directory)
+    merged = Counter()
+    for endpoint in sorted(profiles):
+        stacks = profiles[endpoint]
+        total = sum(stacks.values())
+        click.echo(f'{endpoint}: {total} samples')
+        for frame, count in self_samples(stacks).most_common(top):
+            click.echo(f'  {100.0 * count / total:5.1f}%  {frame}')
+        for stack, count in stacks.items():
+            merged[f'{endpoint};{stack}'] += count
+    if output:
+        write_folded(output, merged)
+
+
+@profile_cli.command('diff')
+@click.argument('before')
+@click.argument('after')
+@click.option('--output', type=click.Path(), help='Write difffolded stacks (before/after counts) here.')
+@click.option('--top', default=10, help='Largest changes to show per route.')
+def diff_command(before, after, output, top):
+    """Compare the profile directories BEFORE and AFTER.
+
+    Changes are reported as each frame's share of its route's samples, so
+    runs of different lengths can be compared.
+    """
+    old, new = load_profile_dir(before), load_profile_dir(after)
+    lines = []
+    for endpoint in sorted(set(old) | set(new)):
+        old_stacks, new_stacks = old.get(endpoint, Counter()), new.get(endpoint, Counter())
+        old_total, new_total = sum(old_stacks.values()) or 1, sum(new_stacks.values()) or 1
+        old_self, new_self = self_samples(old_stacks), self_samples(new_stacks)
+        deltas = {
+            frame: 100.0 * new_self[frame] / new_total - 100.0 * old_self[frame] / old_total
+            for frame in set(old_self) | set(new_self)
+        }
+        click.echo(f'{endpoint}: {sum(old_stacks.values())} -> {sum(new_stacks.values())} samples')
+        for frame, delta in sorted(deltas.items(), key=lambda item: -abs(item[1]))[:top]:
+            click.echo(f'  {delta:+6.1f}%  {frame}')
+        for stack in sorted(set(old_stacks) | set(new_stacks)):
+            lines.append(f'{endpoint};{stack} {old_stacks[stack]} {new_stacks[stack]}\n')
+    if output:
+        with open(output, 'w') as f:
+            f.writelines(lines)
+
+
+route_profiler = RouteProfiler()
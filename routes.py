@@ -1,22 +1,12 @@
 from flask import Blueprint, request, jsonify, render_template, redirect, url_for
 from flask_login import login_user, logout_user, login_required, current_user
-from flask_mail import Message
 from models import db, User
-from app import mail
+from tickets import login_tickets
+from mailer import mailer
 import json
 
 auth_bp = Blueprint('auth', __name__)
 
-def send_email(subject, recipients, body):
-    """Send email helper"""
-    try:
-        msg = Message(subject, recipients=recipients, body=body)
-        mail.send(msg)
-        return True
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        return False
-
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
     """User registration"""
@@ -43,12 +33,7 @@ def register():
         db.session.commit()
         
         # Send verification email
-        verification_link = f"http://localhost:5000/verify-email/{token}"
-        send_email(
-            'Email Verification',
-            [user.email],
-            f'Click here to verify your email: {verification_link}'
-        )
+        mailer.send(mailer.render('verification', user, token))
         
         return jsonify({'message': 'User registered. Check your email to verify.'}), 201
     
@@ -76,7 +61,12 @@ def login():
     if not data or not data.get('username') or not data.get('password'):
         return jsonify({'message': 'Missing username or password'}), 400
     
-    user = User.query.filter_by(username=data['username']).first()
+    user = User.lookup(username=data['username'])
+    
+    if user:
+        # Activation, password and 2FA may have just changed, so decide on the
+        # primary; the replica only turns away unknown usernames
+        user = db.session.get(User, user.id, populate_existing=True)
     
     if not user or not user.is_active:
         return jsonify({'message': 'Please verify your email first'}), 401
@@ -86,7 +76,7 @@ def login():
         if user.two_fa_enabled:
             return jsonify({
                 'message': '2FA required',
-                'user_id': user.id,
+                'ticket': login_tickets.issue(user),
                 '2fa_required': True
             }), 203  # 203 No Content - Need MFA
         
@@ -100,27 +90,29 @@ def verify_2fa():
     """Verify 2FA code"""
     data = request.get_json()
     
-    if not data or not data.get('user_id') or not data.get('code'):
-        return jsonify({'message': 'User ID and code are required'}), 400
+    if not data or not data.get('ticket') or not data.get('code'):
+        return jsonify({'message': 'Login ticket and code are required'}), 400
     
-    user = User.query.get(int(data['user_id']))
+    user = login_tickets.resolve(data['ticket'])
     
     if not user:
-        return jsonify({'message': 'User not found'}), 404
+        return jsonify({'message': 'Invalid or expired login ticket'}), 401
     
     if user.verify_2fa_code(data['code']):
+        login_tickets.consume(data['ticket'])
         login_user(user, remember=data.get('remember_me', False))
         return jsonify({'message': '2FA verified. Login successful.', 'user_id': user.id}), 200
     
-    # Check backup codes
     if data.get('code') in user.get_2fa_backup_codes():
         codes = user.get_2fa_backup_codes()
         codes.remove(data['code'])
         user.two_fa_backup_codes = json.dumps(codes)
         db.session.commit()
+        login_tickets.consume(data['ticket'])
         login_user(user, remember=data.get('remember_me', False))
         return jsonify({'message': 'Backup code used. Login successful.'}), 200
     
+    login_tickets.record_failure(data['ticket'])
     return jsonify({'message': 'Invalid 2FA code'}), 401
 
 @auth_bp.route('/setup-2fa', methods=['POST'])
@@ -196,18 +188,13 @@ def forgot_password():
     if not data or not data.get('email'):
         return jsonify({'message': 'Email is required'}), 400
     
-    user = User.query.filter_by(email=data['email']).first()
+    user = User.lookup(email=data['email'])
     
     if user:
         token = user.generate_reset_token()
         db.session.commit()
         
-        reset_link = f"http://localhost:5000/reset-password/{token}"
-        send_email(
-            'Password Reset Request',
-            [user.email],
-            f'Click here to reset your password: {reset_link}'
-        )
+        mailer.send(mailer.render('reset', user, token))
     
     return jsonify({'message': 'If email exists, password reset link sent'}), 200
 
@@ -266,12 +253,7 @@ def resend_verification():
     token = user.generate_verification_token()
     db.session.commit()
     
-    verification_link = f"http://localhost:5000/verify-email/{token}"
-    send_email(
-        'Email Verification',
-        [user.email],
-        f'Click here to verify your email: {verification_link}'
-    )
+    mailer.send(mailer.render('verification', user, token))
     
     return jsonify({'message': 'Verification email sent'}), 200
 
@@ -0,0 +1,75 @@
+import threading
+import time
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait and share its result or exception. Nothing is cached
+    once the call returns. Works under threaded workers and, with
+    monkey-patched threading, under gevent/eventlet.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+        self._last_report = time.monotonic()
+
+    def do(self, key, func):
+        """Run func() for key, or wait for the in-flight call with that key"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    @property
+    def ratio(self):
+        """Fraction of calls served by another caller's execution"""
+        total = self.executed + self.coalesced
+        return self.coalesced / total if total else 0.0
+
+    def report_due(self, interval):
+        """Return True at most once every interval seconds, for periodic stats"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_report < interval:
+                return False
+            self._last_report = now
+            return True
+
+    def stats(self):
+        """Counters for monitoring"""
+        return {'executed': self.executed, 'coalesced': self.coalesced, 'ratio': round(self.ratio, 4)}
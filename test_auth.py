@@ -1,7 +1,28 @@
 import pytest
+import csv
 import json
-from app import create_app
-from models import db, User
+import pyotp
+import re
+import smtplib
+import secrets
+import threading
+import time
+from datetime import datetime
+import flask_mail
+from flask_mail import Message
+from app import create_app, mail
+from config import Config
+from werkzeug.security import generate_password_hash
+from sqlalchemy import event
+from models import db, User, user_lookups
+from tickets import login_tickets, LoginTicketStore
+from backfill import run_backfill
+from profiler import RouteProfiler
+from mailer import mailer
+from tokens import TokenFactory
+from analytics import daily_activity, export_daily_activity, read_watermark
+from singleflight import SingleFlight
+from admission import admission, AdaptiveLimiter, PRIORITY_SHARES
 
 @pytest.fixture
 def app():
@@ -131,3 +152,641 @@ class TestAuth:
             token = user.generate_verification_token()
             assert user.verification_token == token
             assert user.verification_token_expiry is not None
+
+class TestLoginTickets:
+    """Pending 2FA login ticket tests"""
+    
+    def _create_2fa_user(self, app):
+        with app.app_context():
+            user = User(username='testuser', email='test@example.com')
+            user.set_password('password123')
+            user.is_active = True
+            user.email_verified = True
+            secret = user.setup_2fa()
+            user.enable_2fa()
+            db.session.add(user)
+            db.session.commit()
+            return secret, user.get_2fa_backup_codes()
+    
+    def _login(self, client):
+        return client.post('/login',
+            data=json.dumps({'username': 'testuser', 'password': 'password123'}),
+            content_type='application/json'
+        )
+    
+    def _verify(self, client, ticket, code):
+        return client.post('/verify-2fa',
+            data=json.dumps({'ticket': ticket, 'code': code}),
+            content_type='application/json'
+        )
+    
+    def test_login_issues_ticket(self, client, app):
+        """Test 2FA login returns a ticket instead of the user ID"""
+        self._create_2fa_user(app)
+        data = self._login(client).get_json()
+        assert data['2fa_required'] is True
+        assert data['ticket']
+        assert 'user_id' not in data
+    
+    def test_ticket_cannot_be_replayed(self, client, app):
+        """Test a ticket is consumed by a successful verification"""
+        secret, _ = self._create_2fa_user(app)
+        ticket = self._login(client).get_json()['ticket']
+        code = pyotp.TOTP(secret).now()
+        assert self._verify(client, ticket, code).status_code == 200
+        assert self._verify(client, ticket, code).status_code == 401
+    
+    def test_backup_code_with_ticket(self, client, app):
+        """Test backup codes are accepted against a pending ticket"""
+        _, backup_codes = self._create_2fa_user(app)
+        ticket = self._login(client).get_json()['ticket']
+        response = self._verify(client, ticket, backup_codes[0])
+        assert response.status_code == 200
+        with app.app_context():
+            user = User.query.filter_by(username='testuser').first()
+            assert backup_codes[0] not in user.get_2fa_backup_codes()
+    
+    def test_concurrent_verifications_log_in_once(self, client, app, monkeypatch):
+        """Test two requests racing with the same ticket and code cannot both log in"""
+        secret, _ = self._create_2fa_user(app)
+        ticket = self._login(client).get_json()['ticket']
+        code = pyotp.TOTP(secret).now()
+        checking, finish = threading.Event(), threading.Event()
+        verify_2fa_code = User.verify_2fa_code
+        
+        def slow_verify(user, value):
+            # Hold the first request inside the code check
+            if not checking.is_set():
+                checking.set()
+                finish.wait(5)
+            return verify_2fa_code(user, value)
+        
+        monkeypatch.setattr(User, 'verify_2fa_code', slow_verify)
+        statuses = []
+        
+        def first():
+            with app.app_context():
+                statuses.append(self._verify(app.test_client(), ticket, code).status_code)
+        
+        thread = threading.Thread(target=first)
+        thread.start()
+        assert checking.wait(5)
+        assert self._verify(client, ticket, code).status_code == 401
+        finish.set()
+        thread.join()
+        assert statuses == [200]
+    
+    @pytest.mark.parametrize('change', ['disable_2fa', 'deactivate', 'password'])
+    def test_ticket_revoked_by_account_change(self, client, app, change):
+        """Test account changes after the password step cancel the pending login"""
+        secret, _ = self._create_2fa_user(app)
+        ticket = self._login(client).get_json()['ticket']
+        with app.app_context():
+            user = User.query.filter_by(username='testuser').first()
+            if change == 'disable_2fa':
+                user.disable_2fa()
+            elif change == 'deactivate':
+                user.is_active = False
+            else:
+                user.set_password('newpassword456')
+            db.session.commit()
+        assert self._verify(client, ticket, pyotp.TOTP(secret).now()).status_code == 401
+    
+    def test_forged_ticket_rejected(self, client, app):
+        """Test tickets that were not issued by the server are rejected"""
+        secret, _ = self._create_2fa_user(app)
+        ticket = self._login(client).get_json()['ticket']
+        response = self._verify(client, ticket + 'x', pyotp.TOTP(secret).now())
+        assert response.status_code == 401
+    
+    def test_ticket_dropped_after_failed_attempts(self, client, app):
+        """Test a ticket is invalidated after too many wrong codes"""
+        secret, _ = self._create_2fa_user(app)
+        ticket = self._login(client).get_json()['ticket']
+        for _ in range(login_tickets.max_attempts):
+            assert self._verify(client, ticket, '000000').status_code == 401
+        assert self._verify(client, ticket, pyotp.TOTP(secret).now()).status_code == 401
+    
+    def test_store_is_bounded(self, app):
+        """Test the ticket store evicts the oldest entries when full"""
+        store = LoginTicketStore(app)
+        store.max_entries = 2
+        with app.app_context():
+            user = User(username='testuser', email='test@example.com')
+            first = store.issue(user)
+            store.issue(user)
+            store.issue(user)
+            assert len(store) == 2
+            assert store.resolve(first) is None
+
+class TestBackfill:
+    """Batched backfill tests"""
+    
+    def _create_oauth_users(self, count):
+        for i in range(count):
+            db.session.add(User(username=f'user{i}', email=f'user{i}@example.com', google_id=f'g{i}'))
+        db.session.commit()
+    
+    def test_backfill_resumes_from_checkpoint(self, app):
+        """Test an interrupted backfill continues after the last batch"""
+        self._create_oauth_users(5)
+        progress = run_backfill('oauth-provider', batch_size=2, pause=0, max_batches=1)
+        assert progress.rows_processed == 2
+        assert progress.completed_at is None
+        assert User.query.filter_by(oauth_provider='google').count() == 2
+        
+        progress = run_backfill('oauth-provider', batch_size=2, pause=0)
+        assert progress.rows_processed == 5
+        assert progress.completed_at is not None
+        assert User.query.filter_by(oauth_provider='google').count() == 5
+    
+    def test_backfill_cli(self, app, runner):
+        """Test the backfill CLI reports progress"""
+        self._create_oauth_users(3)
+        result = runner.invoke(args=['backfill', 'run', 'oauth-provider', '--pause', '0'])
+        assert '3 rows processed' in result.output
+        result = runner.invoke(args=['backfill', 'status'])
+        assert 'oauth-provider: 3 rows' in result.output
+
+class TestProfiler:
+    """Route sampling profiler tests"""
+    
+    def test_sample_aggregates_per_route(self):
+        """Test samples are folded and grouped by endpoint"""
+        profiler = RouteProfiler()
+        profiler._active[threading.get_ident()] = 'auth.login'
+        profiler.sample()
+        profiler.sample()
+        stacks = profiler.profiles()['auth.login']
+        assert sum(stacks.values()) == 2
+        assert all('test_auth.py:test_sample_aggregates_per_route' in stack for stack in stacks)
+    
+    def test_sampler_parks_when_idle(self, app, client, tmp_path):
+        """Test the sampler thread only samples while a profiled request runs"""
+        app.config.update(PROFILER_SAMPLE_RATE=1.0, PROFILER_OUTPUT_DIR=str(tmp_path))
+        profiler = RouteProfiler(app)
+        client.post('/login', data=json.dumps({}), content_type='application/json')
+        assert profiler._thread.is_alive()
+        assert not profiler._profiling.is_set()
+        
+        # Let a sample already in progress finish
+        time.sleep(2 * profiler.interval)
+        sampled = []
+        profiler.sample = lambda: sampled.append(1)
+        time.sleep(20 * profiler.interval)
+        assert sampled == []
+    
+    def test_flush_and_diff(self, app, runner, tmp_path):
+        """Test flushed profiles can be dumped and diffed"""
+        for run, count in (('before', 1), ('after', 3)):
+            profiler = RouteProfiler()
+            profiler.output_dir = str(tmp_path / run)
+            profiler._stacks['auth.login']['app.py:login;models.py:check_password'] = count
+            profiler._stacks['auth.login']['app.py:login;routes.py:send_email'] = 1
+            profiler.flush()
+        
+        result = runner.invoke(args=['profile', 'dump', str(tmp_path / 'after')])
+        assert 'auth.login: 4 samples' in result.output
+        assert '75.0%  models.py:check_password' in result.output
+        
+        output = tmp_path / 'diff.folded'
+        result = runner.invoke(args=['profile', 'diff', str(tmp_path / 'before'),
+                                     str(tmp_path / 'after'), '--output', str(output)])
+        assert '+25.0%  models.py:check_password' in result.output
+        assert 'auth.login;app.py:login;models.py:check_password 1 3' in output.read_text()
+
+class TestMailer:
+    """Email rendering and bulk dispatch tests"""
+    
+    def test_render_uses_configured_base_url(self, app):
+        """Test email links are built from APP_BASE_URL"""
+        mailer.base_url = 'https://auth.example.com'
+        try:
+            user = User(username='testuser', email='test@example.com')
+            msg = mailer.render('reset', user, 'abc123')
+        finally:
+            mailer.base_url = app.config['APP_BASE_URL']
+        assert msg.recipients == ['test@example.com']
+        assert 'https://auth.example.com/reset-password/abc123' in msg.body
+        assert 'href="https://auth.example.com/reset-password/abc123"' in msg.html
+    
+    def test_reverify_campaign(self, app, runner):
+        """Test the reverification campaign mails every unverified user in batches"""
+        app.extensions['mail'].suppress = True
+        for i in range(5):
+            db.session.add(User(username=f'user{i}', email=f'user{i}@example.com'))
+        db.session.add(User(username='verified', email='verified@example.com', email_verified=True))
+        db.session.commit()
+        
+        with mail.record_messages() as outbox:
+            result = runner.invoke(args=['mail', 'reverify', '--batch-size', '2'])
+        assert '5 verification emails sent, 0 failed' in result.output
+        assert sorted(m.recipients[0] for m in outbox) == [f'user{i}@example.com' for i in range(5)]
+        tokens = {u.verification_token for u in User.query.filter_by(email_verified=False)}
+        assert all(any(token in m.body for m in outbox) for token in tokens)
+    
+    def _fake_smtp(self, monkeypatch, fail_on=(), refuse=()):
+        """Patch Flask-Mail to use a fake SMTP host that drops the connection
+        when sending the recipients in fail_on (each entry fails once) and
+        refuses the recipients in refuse"""
+        fail_on = list(fail_on)
+        delivered, connections = [], []
+        
+        class FakeHost:
+            def __init__(self):
+                self.alive = True
+                connections.append(self)
+            
+            def sendmail(self, sender, recipients, body, *args):
+                if not self.alive:
+                    raise smtplib.SMTPServerDisconnected('connection closed')
+                if recipients[0] in fail_on:
+                    fail_on.remove(recipients[0])
+                    self.alive = False
+                    raise smtplib.SMTPServerDisconnected('connection closed')
+                if recipients[0] in refuse:
+                    raise smtplib.SMTPRecipientsRefused({recipients[0]: (550, b'No such user')})
+                delivered.append(recipients[0])
+            
+            def quit(self):
+                if not self.alive:
+                    raise smtplib.SMTPServerDisconnected('please run connect() first')
+        
+        monkeypatch.setattr(flask_mail.Connection, 'configure_host', lambda conn: FakeHost())
+        return delivered, connections
+    
+    def _messages(self, count):
+        return [Message('Hi', recipients=[f'user{i}@example.com'], body='hi') for i in range(count)]
+    
+    def test_bulk_reconnects_after_disconnect(self, app, monkeypatch):
+        """Test a dropped connection is reopened and the message retried"""
+        app.extensions['mail'].suppress = False
+        delivered, connections = self._fake_smtp(monkeypatch, ['user1@example.com'])
+        assert mailer.send_bulk([self._messages(5)]) == (5, 0)
+        assert delivered == [f'user{i}@example.com' for i in range(5)]
+        assert len(connections) == 2
+    
+    def test_bulk_refused_recipient_fails_only_that_message(self, app, monkeypatch):
+        """Test a refused recipient does not stop the rest of the campaign"""
+        app.extensions['mail'].suppress = False
+        delivered, connections = self._fake_smtp(monkeypatch, refuse=['user1@example.com'])
+        assert mailer.send_bulk([self._messages(4), self._messages(1)]) == (4, 1)
+        assert delivered == [f'user{i}@example.com' for i in (0, 2, 3, 0)]
+        assert len(connections) == 2
+    
+    def test_bulk_counts_unsent_when_server_stays_down(self, app, monkeypatch):
+        """Test every unsent message is reported and later batches are not drawn"""
+        app.extensions['mail'].suppress = False
+        self._fake_smtp(monkeypatch, ['user1@example.com'] * 2)
+        drawn = []
+        
+        def batches():
+            for batch in (self._messages(5), self._messages(3)):
+                drawn.append(batch)
+                yield batch
+        
+        assert mailer.send_bulk(batches()) == (1, 4)
+        assert len(drawn) == 1
+
+class TestTokenFactory:
+    """Pooled token factory tests"""
+    
+    def test_token_format(self):
+        """Test tokens match secrets.token_urlsafe length and alphabet"""
+        factory = TokenFactory(batch_size=16)
+        for nbytes in (8, 16, 32):
+            token = factory.token_urlsafe(nbytes)
+            assert len(token) == len(secrets.token_urlsafe(nbytes))
+            assert re.fullmatch(r'[A-Za-z0-9_-]+', token)
+        assert len(factory.backup_codes(10)) == 10
+    
+    def test_tokens_unique_across_refills_and_threads(self):
+        """Test no token is handed out twice"""
+        factory = TokenFactory(batch_size=64)
+        results = []
+        
+        def worker():
+            results.extend(factory.verification_token() for _ in range(1000))
+        
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 8000
+        assert len(set(results)) == 8000
+    
+    def test_reset_discards_pool(self):
+        """Test reset drops pre-generated tokens"""
+        factory = TokenFactory(batch_size=4)
+        factory.reset_token()
+        factory.reset()
+        assert factory._pools == {}
+
+class TestReadReplica:
+    """Read/write routing tests"""
+    
+    @pytest.fixture
+    def replica_app(self, tmp_path):
+        class ReplicaConfig(Config):
+            TESTING = True
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.db'}"
+            SQLALCHEMY_BINDS = {'replica': f"sqlite:///{tmp_path / 'replica.db'}"}
+        
+        app = create_app(ReplicaConfig)
+        with app.app_context():
+            db.create_all()
+            db.metadata.create_all(db.engines['replica'])
+            yield app
+            db.session.remove()
+        # The shared db object keeps a metadata per bind key; drop it so
+        # apps without a replica can still create_all()
+        db.metadatas.pop('replica', None)
+    
+    def _insert(self, engine, username, **fields):
+        with engine.begin() as conn:
+            conn.execute(User.__table__.insert().values(
+                username=username, email=f'{username}@example.com', is_active=True, **fields))
+    
+    def test_lookups_use_replica(self, replica_app):
+        """Test lookup helpers read from the replica and queries from the primary"""
+        self._insert(db.engines['replica'], 'replicauser')
+        assert User.lookup(username='replicauser') is not None
+        assert User.lookup_by_id(1).username == 'replicauser'
+        assert User.query.filter_by(username='replicauser').first() is None
+    
+    def test_writes_go_to_primary(self, replica_app):
+        """Test changes to a user found on the replica are written to the primary"""
+        self._insert(db.engines[None], 'testuser')
+        self._insert(db.engines['replica'], 'testuser')
+        user = User.lookup(username='testuser')
+        token = user.generate_reset_token()
+        db.session.commit()
+        db.session.remove()
+        
+        assert User.query.filter_by(reset_token=token).first() is not None
+        assert User.lookup(reset_token=token) is None
+    
+    def test_setup_then_confirm_2fa_with_lagging_replica(self, replica_app):
+        """Test write endpoints read current_user from the primary"""
+        password_hash = generate_password_hash('password123')
+        for engine in (db.engines[None], db.engines['replica']):
+            self._insert(engine, 'testuser', password_hash=password_hash, email_verified=True)
+        
+        client = replica_app.test_client()
+        
+        def send(method, url, **json_body):
+            # A fresh app context per request, as in production, so no session
+            # or cached current_user is shared between requests
+            with replica_app.app_context():
+                return client.open(url, method=method, data=json.dumps(json_body),
+                                   content_type='application/json')
+        
+        assert send('POST', '/login', username='testuser', password='password123').status_code == 200
+        # The replica never receives the secret written by /setup-2fa
+        secret = send('POST', '/setup-2fa').get_json()['secret']
+        assert send('POST', '/confirm-2fa', code=pyotp.TOTP(secret).now()).status_code == 200
+        assert send('GET', '/profile').get_json()['username'] == 'testuser'
+
+    def test_analytics_streams_replica_rows_outside_replica_scope(self, replica_app):
+        """Test analytics reads the replica without routing the caller's queries there"""
+        self._insert(db.engines['replica'], 'replicauser', created_at=datetime(2026, 1, 31, 9))
+        rows = []
+        for row in daily_activity():
+            assert not db.session.info.get('use_replica')
+            rows.append(row)
+        assert [(row['date'], row['signups']) for row in rows] == [('2026-01-31', 1)]
+    
+    def test_login_checks_credentials_on_primary(self, replica_app):
+        """Test login sees a new password and 2FA before the replica does"""
+        self._insert(db.engines['replica'], 'testuser', email_verified=True,
+                     password_hash=generate_password_hash('oldpassword'))
+        self._insert(db.engines[None], 'testuser', email_verified=True,
+                     password_hash=generate_password_hash('newpassword'),
+                     two_fa_enabled=True, two_fa_secret=pyotp.random_base32())
+        client = replica_app.test_client()
+        
+        def login(password):
+            with replica_app.app_context():
+                return client.post('/login', data=json.dumps({'username': 'testuser', 'password': password}),
+                                   content_type='application/json')
+        
+        assert login('oldpassword').status_code == 401
+        response = login('newpassword')
+        assert response.status_code == 203
+        assert response.get_json()['2fa_required'] is True
+
+class TestAnalytics:
+    """User activity export tests"""
+    
+    def _add_user(self, name, created_at, **fields):
+        db.session.add(User(username=name, email=f'{name}@example.com', created_at=created_at, **fields))
+        db.session.commit()
+    
+    def _read(self, path):
+        with open(path, newline='') as f:
+            return list(csv.DictReader(f))
+    
+    def test_daily_activity_aggregates(self, app):
+        """Test daily rows are grouped by signup day"""
+        self._add_user('a', datetime(2026, 1, 31, 9), email_verified=True, two_fa_enabled=True)
+        self._add_user('b', datetime(2026, 1, 31, 17), oauth_provider='github', email_verified=True)
+        self._add_user('c', datetime(2026, 2, 1, 8), oauth_provider='google')
+        
+        rows = list(daily_activity())
+        assert [row['date'] for row in rows] == ['2026-01-31', '2026-02-01']
+        assert rows[0]['signups'] == 2
+        assert rows[0]['verified_ratio'] == 1.0
+        assert rows[0]['two_fa_enabled'] == 1
+        assert rows[0]['oauth_github'] == 1
+        assert rows[0]['password_only'] == 1
+        assert rows[1]['oauth_google'] == 1
+    
+    def test_incremental_export(self, app, runner, tmp_path):
+        """Test incremental exports recompute the watermark day without duplicates"""
+        self._add_user('a', datetime(2026, 1, 31, 9))
+        self._add_user('b', datetime(2026, 2, 1, 8))
+        assert export_daily_activity(str(tmp_path)) == 2
+        assert read_watermark(str(tmp_path)) == '2026-02-01'
+        
+        self._add_user('c', datetime(2026, 2, 1, 20))
+        self._add_user('d', datetime(2026, 2, 2, 7))
+        result = runner.invoke(args=['analytics', 'export', '--output', str(tmp_path)])
+        assert '2 days exported' in result.output
+        
+        assert [r['signups'] for r in self._read(tmp_path / 'daily-2026-01.csv')] == ['1']
+        february = self._read(tmp_path / 'daily-2026-02.csv')
+        assert [(r['date'], r['signups']) for r in february] == [('2026-02-01', '2'), ('2026-02-02', '1')]
+        assert read_watermark(str(tmp_path)) == '2026-02-02'
+
+class TestSingleFlight:
+    """Lookup coalescing tests"""
+    
+    def test_concurrent_calls_share_one_execution(self):
+        """Test callers arriving while a call is in flight reuse its result"""
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+        
+        def slow_lookup():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'row'
+        
+        def worker():
+            results.append(flight.do('key', slow_lookup))
+        
+        leader = threading.Thread(target=worker)
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in followers:
+            thread.start()
+        while flight.coalesced < 4:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+        
+        assert len(calls) == 1
+        assert results == ['row'] * 5
+        assert flight.stats() == {'executed': 1, 'coalesced': 4, 'ratio': 0.8}
+    
+    def test_errors_propagate_and_are_not_cached(self):
+        """Test a failed call raises for its caller and the next call runs again"""
+        flight = SingleFlight()
+        
+        def fail():
+            raise ValueError('db down')
+        
+        with pytest.raises(ValueError):
+            flight.do('key', fail)
+        assert flight.do('key', lambda: 'row') == 'row'
+        assert flight.executed == 2
+    
+    def test_lookup_returns_session_instance(self, app):
+        """Test coalesced lookups return usable, session-bound users"""
+        user = User(username='testuser', email='test@example.com')
+        db.session.add(user)
+        db.session.commit()
+        db.session.remove()
+        
+        found = User.lookup(username='testuser')
+        assert found.email == 'test@example.com'
+        assert User.lookup_by_id(found.id) is found
+        found.oauth_provider = 'github'
+        db.session.commit()
+        assert User.query.filter_by(oauth_provider='github').count() == 1
+        assert User.lookup(username='missing') is None
+
+    def test_concurrent_model_lookups_share_one_query(self, app):
+        """Test concurrent User.lookup calls run one query and each get their own user"""
+        db.session.add(User(username='testuser', email='test@example.com'))
+        db.session.commit()
+        started, release = threading.Event(), threading.Event()
+        queries, results = [], []
+        
+        def hold_user_query(conn, cursor, statement, *args):
+            if statement.startswith('SELECT') and 'user' in statement:
+                queries.append(statement)
+                started.set()
+                release.wait(5)
+        
+        def worker():
+            with app.app_context():
+                user = User.lookup(username='testuser')
+                results.append((user, user.username, user in db.session))
+        
+        coalesced = user_lookups.coalesced
+        event.listen(db.engine, 'before_cursor_execute', hold_user_query)
+        try:
+            leader = threading.Thread(target=worker)
+            leader.start()
+            assert started.wait(5)
+            followers = [threading.Thread(target=worker) for _ in range(4)]
+            for thread in followers:
+                thread.start()
+            while user_lookups.coalesced < coalesced + 4:
+                time.sleep(0.001)
+            release.set()
+            for thread in [leader] + followers:
+                thread.join()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', hold_user_query)
+        
+        assert len(queries) == 1
+        assert [(name, attached) for _, name, attached in results] == [('testuser', True)] * 5
+        assert len({id(user) for user, _, _ in results}) == 5
+    
+    def test_lookup_stats_are_logged(self, app, capsys):
+        """Test the coalescing counters are reported every LOOKUP_STATS_INTERVAL"""
+        app.config['LOOKUP_STATS_INTERVAL'] = 1e-9
+        User.lookup(username='missing')
+        assert "User lookups: {'executed'" in capsys.readouterr().out
+        app.config['LOOKUP_STATS_INTERVAL'] = 3600
+        User.lookup(username='missing')
+        assert capsys.readouterr().out == ''
+
+class TestAdmissionControl:
+    """Overload protection tests"""
+    
+    def test_low_priority_shed_first(self):
+        """Test low-priority work is rejected before critical work"""
+        limiter = AdaptiveLimiter(max_limit=4, target_latency=1.0)
+        assert limiter.try_acquire(PRIORITY_SHARES['low'])
+        assert limiter.try_acquire(PRIORITY_SHARES['low'])
+        assert not limiter.try_acquire(PRIORITY_SHARES['low'])
+        assert limiter.try_acquire(PRIORITY_SHARES['critical'])
+        assert limiter.try_acquire(PRIORITY_SHARES['critical'])
+        assert not limiter.try_acquire(PRIORITY_SHARES['critical'])
+        assert limiter.stats()['shed'] == 2
+    
+    def test_only_critical_admitted_at_min_limit(self):
+        """Test priority shedding still applies once the limit has bottomed out"""
+        limiter = AdaptiveLimiter(max_limit=4, target_latency=0.1, min_limit=2)
+        limiter.limit = float(limiter.min_limit)
+        assert limiter.try_acquire(PRIORITY_SHARES['low'])
+        assert not limiter.try_acquire(PRIORITY_SHARES['low'])
+        assert not limiter.try_acquire(PRIORITY_SHARES['normal'])
+        assert limiter.try_acquire(PRIORITY_SHARES['critical'])
+        assert not limiter.try_acquire(PRIORITY_SHARES['critical'])
+    
+    def test_limit_adapts_to_latency(self):
+        """Test slow requests at saturation shrink the limit and fast ones grow it back"""
+        limiter = AdaptiveLimiter(max_limit=10, target_latency=0.1)
+        held = [limiter.try_acquire() for _ in range(10)]
+        for in_flight in reversed(held):
+            limiter.release(0.5, in_flight)
+        assert limiter.limit < 6
+        shrunk = limiter.limit
+        limiter.release(0.01, limiter.try_acquire())
+        assert limiter.limit > shrunk
+        assert limiter.in_flight == 0
+    
+    def test_idle_limiter_admits_after_slow_requests(self):
+        """Test slow requests one at a time are not treated as overload"""
+        limiter = AdaptiveLimiter(max_limit=32, target_latency=0.3)
+        for _ in range(27):
+            limiter.release(1.0, limiter.try_acquire(PRIORITY_SHARES['low']))
+        assert limiter.limit == 32
+        limiter.limit = float(limiter.min_limit)
+        assert limiter.try_acquire(PRIORITY_SHARES['low'])
+    
+    def test_saturated_class_returns_503(self, client, app):
+        """Test a full heavy class sheds /login while light routes still respond"""
+        heavy = admission.limiters['heavy']
+        held = 0
+        while heavy.try_acquire():
+            held += 1
+        try:
+            response = client.post('/login',
+                data=json.dumps({'username': 'testuser', 'password': 'password123'}),
+                content_type='application/json'
+            )
+            assert response.status_code == 503
+            assert response.headers['Retry-After'] == '1'
+            assert client.get('/').status_code == 200
+        finally:
+            for _ in range(held):
+                heavy.release(0, 1)
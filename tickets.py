@@ -0,0 +1,144 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from models import User
+from tokens import token_factory
+
+
+def _fingerprint(user):
+    """Digest of the credentials a pending login was checked against"""
+    state = f'{user.password_hash}:{user.two_fa_secret}'
+    return hashlib.sha256(state.encode()).hexdigest()
+
+
+class _PendingLogin:
+    """A password-verified login waiting for its second factor"""
+    __slots__ = ('user_id', 'fingerprint', 'expires_at', 'failures', 'claimed')
+
+    def __init__(self, user, expires_at):
+        self.user_id = user.id
+        self.fingerprint = _fingerprint(user)
+        self.expires_at = expires_at
+        self.failures = 0
+        self.claimed = False
+
+
+class LoginTicketStore:
+    """Bounded, expiring store of pending 2FA logins keyed by signed tickets"""
+
+    def __init__(self, app=None):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._serializer = None
+        self.ttl = 300
+        self.max_entries = 10000
+        self.max_attempts = 5
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the store from the application config"""
+        self.ttl = app.config.get('LOGIN_TICKET_TTL', self.ttl)
+        self.max_entries = app.config.get('LOGIN_TICKET_MAX_ENTRIES', self.max_entries)
+        self.max_attempts = app.config.get('LOGIN_TICKET_MAX_ATTEMPTS', self.max_attempts)
+        self._serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='login-ticket')
+        app.extensions['login_tickets'] = self
+
+    def issue(self, user):
+        """Record a pending login for user and return its signed ticket"""
+        ticket_id = token_factory.ticket_id()
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            while len(self._entries) >= self.max_entries:
+                self._entries.popitem(last=False)
+            self._entries[ticket_id] = _PendingLogin(user, now + self.ttl)
+        return self._serializer.dumps(ticket_id)
+
+    def resolve(self, ticket):
+        """Claim a ticket and return its pending user, or None if invalid,
+        expired or already claimed by a concurrent request.
+
+        The claim must be ended with consume() or record_failure(). The user
+        is loaded from the primary with concurrent loads coalesced, and the
+        ticket is dropped if the account was deactivated, lost 2FA or changed
+        credentials since the password step.
+        """
+        entry = self._claim(ticket)
+        if entry is None:
+            return None
+        user = User.load(entry.user_id)
+        if (user is None or not user.is_active or not user.two_fa_enabled
+                or _fingerprint(user) != entry.fingerprint):
+            self.consume(ticket)
+            return None
+        return user
+
+    def consume(self, ticket):
+        """Invalidate a ticket once its login has completed"""
+        ticket_id = self._unsign(ticket)
+        if ticket_id is None:
+            return
+        with self._lock:
+            self._entries.pop(ticket_id, None)
+
+    def record_failure(self, ticket):
+        """Count a failed code attempt and release the claim, dropping the
+        ticket past the limit"""
+        ticket_id = self._unsign(ticket)
+        if ticket_id is None:
+            return
+        with self._lock:
+            entry = self._entries.get(ticket_id)
+            if entry is None:
+                return
+            entry.failures += 1
+            entry.claimed = False
+            if entry.failures >= self.max_attempts:
+                del self._entries[ticket_id]
+
+    def clear(self):
+        """Drop every pending login"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _unsign(self, ticket):
+        if not isinstance(ticket, str):
+            return None
+        try:
+            return self._serializer.loads(ticket, max_age=self.ttl)
+        except BadSignature:
+            return None
+
+    def _claim(self, ticket):
+        ticket_id = self._unsign(ticket)
+        if ticket_id is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(ticket_id)
+            if entry is None or entry.claimed:
+                return None
+            if entry.expires_at <= now:
+                del self._entries[ticket_id]
+                return None
+            # Only one request at a time may check a code against the ticket
+            entry.claimed = True
+            return entry
+
+    def _evict_expired(self, now):
+        # Entries are inserted in expiry order, so the oldest expire first
+        while self._entries:
+            ticket_id, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            del self._entries[ticket_id]
+
+
+login_tickets = LoginTicketStore()